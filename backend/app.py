@@ -1,15 +1,24 @@
-from flask import Flask, request, jsonify, send_file, after_this_request
+from flask import Flask, Response, request, jsonify, send_file, after_this_request
 from pathlib import Path
-import tempfile, shutil, os
+import tempfile, shutil, os, zipfile, json
 from uuid import uuid4
 from threading import Thread
+from collections import deque
 from tools.merge_invoice_and_screenshot import merge
-from tools.extract_invoice import extract as extract_invoice   # 新增
-from tools.zhaobiao_spider.main import run as run_zhaobiao
+from tools.extract_invoice import extract as extract_invoice, hit_rates, write_xlsx, xlsx_available   # 新增
+from tools.zhaobiao_spider.main import run as run_zhaobiao, run_many as run_zhaobiao_many
+from tools.zhaobiao_spider import store as zhaobiao_store
+from tools.job_meter import JobMeter, ResourceLimitExceeded, admit, dir_size, MAX_RSS_MB, MAX_TMP_MB
 
 app = Flask(__name__,
             static_folder="../frontend",
             static_url_path="")
+# 设了临时盘上限时，超大的上传在 Werkzeug 解析请求体阶段就以 413 拒绝
+app.config["MAX_CONTENT_LENGTH"] = MAX_TMP_MB * 1024 * 1024 if MAX_TMP_MB else None
+
+@app.errorhandler(413)
+def too_large(e):
+    return jsonify({"error": f"上传内容超过临时盘上限 {MAX_TMP_MB} MB"}), 413
 
 @app.route("/")
 def index():
@@ -21,45 +30,161 @@ def index():
 #   pct: 0-100,
 #   pdf/txt/file: str (生成的路径),
 #   unpaired: list[str],
+#   hit_rates: dict (发票提取的表头区域命中率),
+#   rows_done: int (发票提取已解析份数), xlsx: str,
+#   resources: dict (见 tools.job_meter.JobMeter.snapshot，运行中每 0.5s 刷新),
 #   error: str
 # }
 tasks = {}
+# task_id -> list[dict]  发票提取逐条结果（未排序），经 /api/extract/<id>/rows 增量拉取
+task_rows = {}
+# 已结束任务的资源记录，最近 200 条
+history = deque(maxlen=200)
+
+# ----------------------- 资源记账 -----------------------
+def _limit(params, key: str, server_max: int) -> int:
+    """
+    单个任务可用 max_rss_mb / max_tmp_mb 收紧上限，但不能放宽：
+    不传、传 null 或 0 时用服务器的 JOB_MAX_*；大于服务器上限时按服务器上限。
+    非法值抛 ValueError。
+    """
+    raw = params.get(key)
+    if raw is None or raw == "":
+        return server_max
+    try:
+        val = int(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} 须为非负整数（MB）")
+    if val < 0:
+        raise ValueError(f"{key} 须为非负整数（MB）")
+    if val == 0:
+        return server_max
+    return min(val, server_max) if server_max else val
+
+def _limits(params) -> tuple[int, int]:
+    return (_limit(params, "max_rss_mb", MAX_RSS_MB),
+            _limit(params, "max_tmp_mb", MAX_TMP_MB))
+
+def _new_meter(task_id, tmp_dir, limits) -> JobMeter:
+    def on_update(snap):
+        tasks[task_id]["resources"] = snap
+    return JobMeter(tmp_dir, *limits, on_update=on_update)
+
+def _finish(task_id, meter: JobMeter):
+    info = tasks[task_id]
+    info["resources"] = meter.snapshot()
+    history.append({"task_id": task_id, "type": info.get("type", "merge"),
+                    "status": info["status"], "resources": info["resources"]})
+
+def _file_size(path) -> int:
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+def _check_upload_size(max_tmp_mb: int):
+    """按请求头的 Content-Length 预判，超出临时盘上限的上传不落盘就拒绝"""
+    length = request.content_length or 0
+    if max_tmp_mb and length > max_tmp_mb * 1024 * 1024:
+        raise ResourceLimitExceeded(f"上传内容 {length / 1024 / 1024:.1f} MB 超过临时盘上限 {max_tmp_mb} MB")
+
+def _save_uploads(work_dir: Path, max_tmp_mb: int):
+    """保存上传文件；超出临时盘上限时删掉目录并抛 ResourceLimitExceeded"""
+    for f in request.files.getlist("files"):
+        dst = work_dir / Path(f.filename)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        f.save(dst)
+    size = dir_size(work_dir)
+    if max_tmp_mb and size > max_tmp_mb * 1024 * 1024:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise ResourceLimitExceeded(f"上传文件 {size / 1024 / 1024:.1f} MB 超过临时盘上限 {max_tmp_mb} MB")
+    return size
 
 # ---------- 创建【发票信息提取】任务 2025-08-05新增功能2----------
 @app.route("/api/extract", methods=["POST"])
 def api_create_extract():
     if not request.files:
         return jsonify({"error": "请使用 FormData 上传文件"}), 400
+    xlsx = request.form.get("xlsx", "0") == "1"
+    if xlsx and not xlsx_available():
+        return jsonify({"error": "服务器未安装 openpyxl，无法导出 Excel"}), 400
+    try:
+        limits = _limits(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        admit(limits[0])
+    except ResourceLimitExceeded as e:
+        return jsonify({"error": str(e)}), 503
+    try:
+        _check_upload_size(limits[1])
+    except ResourceLimitExceeded as e:
+        return jsonify({"error": str(e)}), 413
 
     task_id = uuid4().hex
     tasks[task_id] = {"status": "uploading", "pct": 0, "type": "extract"}
 
     work_dir = Path(tempfile.mkdtemp(prefix=f"extract_{task_id}_"))
-    for f in request.files.getlist("files"):
-        dst = work_dir / Path(f.filename)
-        dst.parent.mkdir(parents=True, exist_ok=True)
-        f.save(dst)
+    try:
+        upload_size = _save_uploads(work_dir, limits[1])
+    except ResourceLimitExceeded as e:
+        tasks[task_id] = {"status": "error", "type": "extract", "error": str(e)}
+        return jsonify({"error": str(e)}), 413
+
+    # layout=0 时整页取字（表头区域提取识别不了的版式可用）
+    layout = request.form.get("layout", "1") != "0"
+    rows = task_rows[task_id] = []
+    tasks[task_id]["rows_done"] = 0
+
+    meter = _new_meter(task_id, work_dir, limits)
+    meter.add_read(upload_size)
 
     def _worker():
         try:
             tasks[task_id]["status"] = "processing"
 
-            def report(p): tasks[task_id]["pct"] = p
+            def report(p):
+                meter.check()
+                tasks[task_id]["pct"] = p
+
+            def push(row):
+                rows.append(row)
+                tasks[task_id]["rows_done"] = len(rows)
 
-            txt_path = extract_invoice(str(work_dir), report)
+            stats = {}
+            with meter:
+                txt_path = extract_invoice(str(work_dir), report, layout=layout, stats=stats,
+                                           row_cb=push)
+                xlsx_path = write_xlsx(txt_path) if xlsx else None
+            meter.add_written(_file_size(txt_path) + _file_size(xlsx_path))
             tasks[task_id].update({
                 "status": "done",
                 "pct": 100,
-                "txt": txt_path
+                "txt": txt_path,
+                "hit_rates": hit_rates(stats)
             })
+            if xlsx_path:
+                tasks[task_id]["xlsx"] = xlsx_path
         except Exception as e:
-            tasks[task_id] = {"status": "error", "error": str(e)}
+            tasks[task_id] = {"status": "error", "type": "extract", "error": str(e)}
+            task_rows.pop(task_id, None)
         finally:
-            pass
+            _finish(task_id, meter)
 
     Thread(target=_worker, daemon=True).start()
     return jsonify({"task_id": task_id}), 202
 
+# ---------- 发票提取：增量结果（NDJSON） ----------
+@app.route("/api/extract/<task_id>/rows")
+def api_extract_rows(task_id):
+    """返回第 since 条（从 0 计）之后已解析的行，每行一个 JSON；X-Next-Since 为下次请求的游标。"""
+    rows = task_rows.get(task_id)
+    if rows is None:
+        return jsonify({"error": "task not found"}), 404
+    since = max(0, request.args.get("since", 0, type=int))
+    chunk = rows[since:]
+    body = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in chunk)
+    resp = Response(body, mimetype="application/x-ndjson")
+    resp.headers["X-Next-Since"] = str(since + len(chunk))
+    return resp
+
 
 
 # --------------------- 创建任务 -----------------------
@@ -67,27 +192,46 @@ def api_create_extract():
 def api_create_merge():
     if not request.files:
         return jsonify({"error": "请使用 FormData 上传文件"}), 400
+    try:
+        limits = _limits(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        admit(limits[0])
+    except ResourceLimitExceeded as e:
+        return jsonify({"error": str(e)}), 503
+    try:
+        _check_upload_size(limits[1])
+    except ResourceLimitExceeded as e:
+        return jsonify({"error": str(e)}), 413
 
     task_id = uuid4().hex
     tasks[task_id] = {"status": "uploading", "pct": 0}
 
     # 保存上传文件到临时目录
     work_dir = Path(tempfile.mkdtemp(prefix=f"merge_{task_id}_"))
-    for f in request.files.getlist("files"):
-        dst = work_dir / Path(f.filename)
-        dst.parent.mkdir(parents=True, exist_ok=True)
-        f.save(dst)
+    try:
+        upload_size = _save_uploads(work_dir, limits[1])
+    except ResourceLimitExceeded as e:
+        tasks[task_id] = {"status": "error", "error": str(e)}
+        return jsonify({"error": str(e)}), 413
 
     inv_ratio = float(request.form.get("inv_ratio", 0.75))
+    meter = _new_meter(task_id, work_dir, limits)
+    meter.add_read(upload_size)
 
     # 后台线程处理
     def _worker():
         try:
             tasks[task_id]["status"] = "processing"
 
-            def report(p): tasks[task_id]["pct"] = p
+            def report(p):
+                meter.check()
+                tasks[task_id]["pct"] = p
 
-            pdf_path, unpaired = merge(str(work_dir), inv_ratio, report)
+            with meter:
+                pdf_path, unpaired = merge(str(work_dir), inv_ratio, report)
+            meter.add_written(_file_size(pdf_path))
 
             tasks[task_id].update({
                 "status": "done" if not unpaired else "partial",
@@ -98,6 +242,7 @@ def api_create_merge():
         except Exception as e:
             tasks[task_id] = {"status": "error", "error": str(e)}
         finally:
+            _finish(task_id, meter)
             shutil.rmtree(work_dir, ignore_errors=True)
 
     Thread(target=_worker, daemon=True).start()
@@ -108,29 +253,95 @@ def api_create_merge():
 @app.route("/api/zhaobiao", methods=["POST"])
 def api_zhaobiao():
     data = request.get_json() or {}
+    # equal 可以是单个代码、逗号分隔的字符串或列表
     equal = data.get("equal") or "002001009"
+    equals = equal if isinstance(equal, list) else str(equal).split(",")
+    equals = [str(e).strip() for e in equals if str(e).strip()] or ["002001009"]
     rn = int(data.get("rn", 100))
     outfmt = data.get("out", "csv")
     start = data.get("start")
     end = data.get("end")
+    workers = int(data.get("workers", 4))
+    rate = float(data.get("rate", 5.0))
+    engine = "async" if data.get("engine") == "async" else "sync"
+    max_connections = int(data.get("max_connections", 100))
+    http2 = bool(data.get("http2", False))
+    try:
+        limits = _limits(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        admit(limits[0])
+    except ResourceLimitExceeded as e:
+        return jsonify({"error": str(e)}), 503
 
     task_id = uuid4().hex
     tasks[task_id] = {"status": "processing", "pct": 0, "type": "zhaobiao"}
+    # 爬虫没有临时目录，只记内存与网络；每个响应都会触发一次限额检查
+    meter = _new_meter(task_id, None, limits)
 
     def _worker():
         try:
-            file_path = run_zhaobiao(equal, rn, outfmt, start, end, True)
+            if len(equals) == 1:
+                with meter:
+                    file_path = run_zhaobiao(equals[0], rn, outfmt, start, end, True,
+                                             engine, max_connections, http2,
+                                             net_cb=meter.on_response, rate=rate)
+                meter.add_written(_file_size(file_path))
+                tasks[task_id].update({
+                    "status": "done",
+                    "pct": 100,
+                    "file": file_path
+                })
+                return
+
+            with meter:
+                summary_path, results = run_zhaobiao_many(
+                    equals, rn, outfmt, start, end, True, workers, rate,
+                    engine, max_connections, http2, net_cb=meter.on_response,
+                    cpu_cb=meter.add_cpu)
+            # 各分类结果 + 汇总打成一个 zip 供下载
+            zip_path = Path(summary_path).with_suffix(".zip")
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                zf.write(summary_path, Path(summary_path).name)
+                for r in results.values():
+                    if r["file"]:
+                        zf.write(r["file"], Path(r["file"]).name)
+            meter.add_written(_file_size(str(zip_path)))
+            failed = [e for e, r in results.items() if r["error"]]
             tasks[task_id].update({
-                "status": "done",
+                "status": "partial" if failed else "done",
                 "pct": 100,
-                "file": file_path
+                "file": str(zip_path),
+                "categories": results
             })
         except Exception as e:
-            tasks[task_id] = {"status": "error", "error": str(e)}
+            tasks[task_id] = {"status": "error", "type": "zhaobiao", "error": str(e)}
+        finally:
+            _finish(task_id, meter)
 
     Thread(target=_worker, daemon=True).start()
     return jsonify({"task_id": task_id}), 202
 
+# --------------------- 招标本地库查询 -----------------------
+@app.route("/api/zhaobiao/search")
+def api_zhaobiao_search():
+    """只查本地库，不发网络请求。参数：start end location min_amount max_amount q equal limit offset"""
+    a = request.args
+    try:
+        min_amount = float(a["min_amount"]) if a.get("min_amount") else None
+        max_amount = float(a["max_amount"]) if a.get("max_amount") else None
+        limit = min(int(a.get("limit", 100)), 1000)
+        offset = int(a.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "min_amount/max_amount/limit/offset 须为数字"}), 400
+
+    result = zhaobiao_store.search(
+        start=a.get("start"), end=a.get("end"), location=a.get("location"),
+        min_amount=min_amount, max_amount=max_amount, q=a.get("q"),
+        equal=a.get("equal"), limit=limit, offset=offset)
+    return jsonify(result)
+
 # --------------------- 进度查询 -----------------------
 @app.route("/api/progress/<task_id>")
 def api_progress(task_id):
@@ -139,6 +350,12 @@ def api_progress(task_id):
         return jsonify({"error": "task not found"}), 404
     return jsonify(info)
 
+# --------------------- 资源历史 -----------------------
+@app.route("/api/history")
+def api_history():
+    """最近结束的任务及其资源占用，新的在前"""
+    return jsonify(list(reversed(history)))
+
 # --------------------- 结果下载 -----------------------
 @app.route("/api/download/<task_id>")
 def api_download(task_id):
@@ -149,10 +366,16 @@ def api_download(task_id):
     if info["status"] not in ("done", "partial"):
         return jsonify({"error": "not ready"}), 409
 
-    # 这时 info 里可能有 pdf、txt 或其他文件
-    file_path = info.get("pdf") or info.get("txt") or info.get("file")
+    # 这时 info 里可能有 pdf、txt 或其他文件；?kind=xlsx 取附带的 Excel
+    kind = request.args.get("kind")
+    if kind:
+        file_path = info.get(kind) if kind in ("pdf", "txt", "xlsx", "file") else None
+    else:
+        file_path = info.get("pdf") or info.get("txt") or info.get("file")
     if not file_path or not Path(file_path).exists():
         return jsonify({"error": "file missing"}), 410
+    # 结果文件都已生成，逐条结果不再需要
+    task_rows.pop(task_id, None)
 
     @after_this_request
     def _cleanup(response):
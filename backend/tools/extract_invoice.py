@@ -6,7 +6,7 @@ extract_invoice.py  —  批量解析发票 / 行程报销单
   1) 文件名以数字或数字.数字开头 → 自然升序
   2) 文件名以 YYYY-MM-DD 开头 → 日期倒序
   3) 其余保持原顺序
-依赖：pdfplumber
+依赖：pdfplumber（导出 xlsx 时另需 openpyxl）
 """
 
 import re
@@ -34,11 +34,25 @@ def format_workmeal(stem: str) -> str:
     return f"{people}人，人均约{per}元，事由：加班"
 
 
-def extract_invoice_page1(pdf_path: Path):
-    """普通发票：抓发票号码(20 或 8 位)和日期"""
-    with pdfplumber.open(pdf_path) as doc:
-        text = doc.pages[0].extract_text() or ""
+# ---------- 版面区域 ----------
+# 比例坐标 (x0, top, x1, bottom)，相对页面宽高；只在这些区域内取字，省去大段明细行的排版。
+REGION_INVOICE_HEADER = (0.55, 0.0, 1.0, 0.3)   # 右上角：发票号码 / 开票日期
+REGION_TRIP_HEADER = (0.0, 0.0, 1.0, 0.35)      # 顶部：行程起止日期那一行
+
+TRIP_RANGE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})\s*至\s*(\d{4}-\d{2}-\d{2})')
+
+
+def _region_text(page, region) -> str:
+    """裁剪页面到比例区域后取文字"""
+    x0, top, x1, bottom = region
+    w, h = page.width, page.height
+    bbox = (page.bbox[0] + x0 * w, page.bbox[1] + top * h,
+            page.bbox[0] + x1 * w, page.bbox[1] + bottom * h)
+    return page.crop(bbox).extract_text() or ""
 
+
+def _parse_invoice_text(text: str):
+    """返回 (号码, 日期, 号码是否带“发票号码”标签)"""
     m_num = re.search(r'发票号码[：:\s]*([0-9]{20}|[0-9]{8})', text)
     if m_num:
         num = m_num.group(1)
@@ -48,14 +62,55 @@ def extract_invoice_page1(pdf_path: Path):
 
     m_date = re.search(r'(\d{4}[年/-]\d{2}[月/-]\d{2}[日]?)', text)
     date = m_date.group(1) if m_date else ""
+    return num, date, m_num is not None
+
+
+def _hit(stats, kind: str, key: str):
+    if stats is not None:
+        stats.setdefault(kind, {"region": 0, "fallback": 0, "full": 0, "miss": 0})[key] += 1
+
+
+def extract_invoice_page1(pdf_path: Path, layout: bool = True, stats=None):
+    """普通发票：抓发票号码(20 或 8 位)和日期
+
+    layout=True 时先只读右上角表头区域，带“发票号码”标签的号码和日期都拿到才直接返回；
+    否则退回整页文字。stats 传入 dict 时累计 region/fallback/miss 次数；
+    layout=False 时识别到的记为 full（没走区域提取，不算回退）。
+    """
+    with pdfplumber.open(pdf_path) as doc:
+        page = doc.pages[0]
+        num = date = ""
+        if layout:
+            num, date, labelled = _parse_invoice_text(_region_text(page, REGION_INVOICE_HEADER))
+            # 裁剪区里的无标签数字可能是税号、代码等，只有带标签的号码才可信
+            if num and date and labelled:
+                _hit(stats, "invoice", "region")
+                return num, date
+            if not labelled:
+                num = ""
+        full_num, full_date, _ = _parse_invoice_text(page.extract_text() or "")
+
+    num, date = num or full_num, date or full_date
+    if not (num or date):
+        _hit(stats, "invoice", "miss")
+    else:
+        _hit(stats, "invoice", "fallback" if layout else "full")
     return num, date
 
 
-def extract_trip_page1(pdf_path: Path):
-    """行程报销单：抓‘YYYY-MM-DD 至 YYYY-MM-DD’"""
+def extract_trip_page1(pdf_path: Path, layout: bool = True, stats=None):
+    """行程报销单：抓‘YYYY-MM-DD 至 YYYY-MM-DD’
+
+    layout=True 时先只读页面顶部的日期范围行，未命中再退回整页文字。
+    """
     with pdfplumber.open(pdf_path) as doc:
-        text = doc.pages[0].extract_text() or ""
-    m = re.search(r'(\d{4}-\d{2}-\d{2})\s*至\s*(\d{4}-\d{2}-\d{2})', text)
+        page = doc.pages[0]
+        m = TRIP_RANGE_RE.search(_region_text(page, REGION_TRIP_HEADER)) if layout else None
+        if m:
+            _hit(stats, "trip", "region")
+        else:
+            m = TRIP_RANGE_RE.search(page.extract_text() or "")
+            _hit(stats, "trip", ("fallback" if layout else "full") if m else "miss")
     if m:
         date_range = f"{m.group(1)} 至 {m.group(2)}"
         note = f"行程起止日期：{date_range}，外差车费，施工配合、开会等"
@@ -64,14 +119,62 @@ def extract_trip_page1(pdf_path: Path):
     return note
 
 
+def hit_rates(stats: dict) -> dict:
+    """{'invoice': {'region': 8, 'fallback': 2, 'full': 0, 'miss': 0}} -> 附带 region_rate 的副本
+
+    整页模式（只有 full/miss）下没有区域命中率，region_rate 为 None。
+    """
+    out = {}
+    for kind, c in stats.items():
+        tried = c["region"] + c["fallback"]
+        total = tried + c["miss"]
+        out[kind] = {**c, "region_rate": round(c["region"] / total, 3) if tried else None}
+    return out
+
+
 # ---------- 自然排序 key ----------
 def natural_key(s: str) -> Tuple[int, ...]:
     """'1.10.3' -> (1,10,3)"""
     return tuple(int(x) for x in s.split('.'))
 
 
+# ---------- 输出 ----------
+COLUMNS = ("文件名", "发票号码", "开票日期", "说明")
+
+
+def xlsx_available() -> bool:
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def write_xlsx(txt_path: str) -> str:
+    """把 extract() 写出的 TSV 同列同序转成同名 .xlsx（需要 openpyxl），返回其路径"""
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "发票"
+    with open(txt_path, encoding="utf-8") as f:
+        for line in f:
+            ws.append(line.rstrip("\n").split("\t"))
+    # 发票号码按文本存，避免 20 位数字被 Excel 转成科学计数法
+    for cell in ws["B"][1:]:
+        cell.number_format = "@"
+    out = Path(txt_path).with_suffix(".xlsx")
+    wb.save(out)
+    return str(out)
+
+
 # ---------- 主批量函数 ----------
-def extract(folder: str, progress_cb=None) -> str:
+def extract(folder: str, progress_cb=None, layout: bool = True, stats=None,
+            row_cb=None) -> str:
+    """
+    解析 folder 下所有 PDF，写出 invoice_{ts}.txt 并返回其路径（需要 Excel 时再调 write_xlsx）。
+    layout=True 走表头区域提取；stats 传入 dict 时写入各类命中计数（见 hit_rates）。
+    row_cb(row:dict) -> None  # 每解析完一份立即推送（未排序），键为 COLUMNS
+    """
     folder = Path(folder)
     pdfs: List[Path] = sorted(folder.rglob("*.pdf"), key=lambda p: p.name.lower())
 
@@ -81,13 +184,15 @@ def extract(folder: str, progress_cb=None) -> str:
     for idx, pdf in enumerate(pdfs, 1):
         stem = pdf.stem
         if "行程" in stem:                               # 行程报销单
-            note = extract_trip_page1(pdf)
+            note = extract_trip_page1(pdf, layout, stats)
             num, date = "", ""
         else:                                            # 普通发票
-            num, date = extract_invoice_page1(pdf)
+            num, date = extract_invoice_page1(pdf, layout, stats)
             note = format_workmeal(stem)
 
         row = (pdf.name, num, date, note)
+        if row_cb:
+            row_cb(dict(zip(COLUMNS, row)))
 
         # ---- 分类判断（先判日期，后判数字） ----
         if re.match(r'^\d{4}-\d{2}-\d{2}', stem):        # 段 2：日期前缀
@@ -116,7 +221,7 @@ def extract(folder: str, progress_cb=None) -> str:
     ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     out_file = folder / f"invoice_{ts}.txt"
     with open(out_file, "w", encoding="utf-8") as f:
-        f.write("文件名\t发票号码\t开票日期\t说明\n")
+        f.write("\t".join(COLUMNS) + "\n")
         for fn, num, date, note in rows:
             f.write(f"{fn}\t{num}\t{date}\t{note}\n")
 
@@ -128,11 +233,30 @@ def extract(folder: str, progress_cb=None) -> str:
 # ---------- CLI 测试 ----------
 if __name__ == "__main__":
     import argparse
+    import json
     ap = argparse.ArgumentParser(description="批量解析发票 / 行程报销单 并排序")
     ap.add_argument("folder", nargs="?", default=".", help="待解析目录")
+    ap.add_argument("--full-page", action="store_true", help="禁用表头区域提取，整页取字")
+    ap.add_argument("--xlsx", action="store_true", help="另存一份 Excel（需要 openpyxl）")
+    ap.add_argument("--stream", action="store_true", help="逐条输出 NDJSON（代替进度条）")
     args = ap.parse_args()
 
     def bar(p): print(f"\r进度 {p}%", end="", flush=True)
 
-    output = extract(args.folder, bar)
+    def emit(row): print(json.dumps(row, ensure_ascii=False), flush=True)
+
+    if args.xlsx and not xlsx_available():
+        ap.error("导出 Excel 需要先安装 openpyxl")
+
+    stats = {}
+    output = extract(args.folder, None if args.stream else bar, layout=not args.full_page,
+                     stats=stats, row_cb=emit if args.stream else None)
     print(f"\n✅ 结果已保存到 {output}")
+    if args.xlsx:
+        print(f"✅ Excel 已保存到 {write_xlsx(output)}")
+    for kind, c in hit_rates(stats).items():
+        if c["region_rate"] is None:
+            print(f"{kind}: 整页识别 {c['full']}，未识别 {c['miss']}")
+        else:
+            print(f"{kind}: 区域命中 {c['region']}，整页回退 {c['fallback']}，未识别 {c['miss']}"
+                  f"（命中率 {c['region_rate']:.0%}）")
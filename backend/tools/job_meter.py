@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+job_meter.py  —  后台任务的资源记账与限额
+记录：墙钟时间、CPU 时间、峰值 RSS、读写字节数、临时目录峰值占用、网络请求数/字节数。
+限额：JOB_MAX_RSS_MB / JOB_MAX_TMP_MB（环境变量，0 表示不限），超限时下一次 check() 抛
+ResourceLimitExceeded，任务立即失败，而不是把整台机器拖进 swap。
+
+注意：所有任务跑在同一进程的线程里，RSS 只能取进程级数值，
+所以“峰值 RSS”是任务运行期间进程的峰值；CPU 时间是任务主线程的 thread_time，
+加上工作线程通过 add_cpu() 报上来的部分（见 zhaobiao_spider.main.run_many 的 cpu_cb）。
+依赖：psutil（可选；缺失时 Linux 读 /proc，其他平台退回 ru_maxrss）
+"""
+
+import os
+import sys
+import time
+import threading
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:  # 可选依赖
+    psutil = None
+
+MAX_RSS_MB = int(os.environ.get("JOB_MAX_RSS_MB", 0))
+MAX_TMP_MB = int(os.environ.get("JOB_MAX_TMP_MB", 0))
+
+_MB = 1024 * 1024
+
+
+class ResourceLimitExceeded(RuntimeError):
+    pass
+
+
+def current_rss() -> int:
+    """进程当前常驻内存（字节）"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # macOS 单位是字节
+
+
+def dir_size(path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # 统计途中被删掉的临时文件
+    return total
+
+
+def admit(max_rss_mb: int = MAX_RSS_MB):
+    """新任务准入：进程内存已超限时直接拒绝，不再往上叠任务。"""
+    if max_rss_mb and current_rss() > max_rss_mb * _MB:
+        raise ResourceLimitExceeded(
+            f"服务器内存占用已超过 {max_rss_mb} MB，请稍后再试")
+
+
+class JobMeter:
+    """
+    用法（在任务线程里）：
+        meter = JobMeter(work_dir, on_update=lambda snap: ...)
+        with meter:
+            ... 期间在进度回调里调 meter.check()
+        meter.snapshot()
+    后台采样线程每 interval 秒更新峰值并检查限额。
+    """
+
+    def __init__(self, tmp_dir=None, max_rss_mb: int = MAX_RSS_MB, max_tmp_mb: int = MAX_TMP_MB,
+                 interval: float = 0.5, on_update=None):
+        self.tmp_dir = Path(tmp_dir) if tmp_dir else None
+        self.max_rss = max_rss_mb * _MB
+        self.max_tmp = max_tmp_mb * _MB
+        self.interval = interval
+        self.on_update = on_update
+
+        self.bytes_read = self.bytes_written = 0
+        self.net_requests = self.net_bytes = 0
+        self.peak_rss = self.peak_tmp = 0
+        self.exceeded = None
+        self._t0 = self._t1 = None
+        self._cpu0 = self._cpu = self._cpu_workers = 0.0
+        self._tid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # ---- 生命周期 ----
+    def __enter__(self):
+        self._tid = threading.get_ident()
+        self._t0 = time.monotonic()
+        self._cpu0 = time.thread_time()
+        self._sample()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._sampler.join()
+        self._update_cpu()
+        self._sample()
+        self._t1 = time.monotonic()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+            if self.on_update:
+                self.on_update(self.snapshot())
+
+    def _sample(self):
+        rss = current_rss()
+        tmp = dir_size(self.tmp_dir) if self.tmp_dir and self.tmp_dir.exists() else 0
+        with self._lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_tmp = max(self.peak_tmp, tmp)
+            if self.exceeded:
+                return
+            if self.max_rss and rss > self.max_rss:
+                # RSS 是整个服务进程的，超限可能是同时运行的其他任务造成的，提示里要说清
+                self.exceeded = (f"服务进程内存占用 {rss / _MB:.1f} MB 超过上限 {self.max_rss // _MB} MB"
+                                 f"（按进程统计，含同时运行的其他任务，本任务被一并中止）")
+            elif self.max_tmp and tmp > self.max_tmp:
+                self.exceeded = f"临时目录 {tmp / _MB:.1f} MB 超过上限 {self.max_tmp // _MB} MB"
+
+    def _update_cpu(self):
+        # thread_time 只对调用线程有效，只在任务主线程里取
+        if threading.get_ident() == self._tid:
+            self._cpu = time.thread_time() - self._cpu0
+
+    # ---- 任务内调用 ----
+    def check(self):
+        """超限则抛 ResourceLimitExceeded；放在进度回调等会被频繁调用的地方。"""
+        self._update_cpu()
+        if self.exceeded:
+            raise ResourceLimitExceeded(self.exceeded)
+
+    def add_read(self, n: int):
+        with self._lock:
+            self.bytes_read += n
+
+    def add_written(self, n: int):
+        with self._lock:
+            self.bytes_written += n
+
+    def add_cpu(self, seconds: float):
+        """工作线程结束时报告自己的 thread_time 增量（主线程的由 meter 自己统计）"""
+        with self._lock:
+            self._cpu_workers += seconds
+
+    def on_response(self, nbytes: int):
+        """网络响应回调（见 zhaobiao_spider 的 net_cb）"""
+        with self._lock:
+            self.net_requests += 1
+            self.net_bytes += nbytes
+        self.check()
+
+    # ---- 输出 ----
+    def snapshot(self) -> dict:
+        end = self._t1 or time.monotonic()
+        with self._lock:
+            return {
+                "wall_s": round(end - self._t0, 3) if self._t0 else 0.0,
+                "cpu_s": round(self._cpu + self._cpu_workers, 3),
+                "peak_rss_mb": round(self.peak_rss / _MB, 1),
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+                "tmp_peak_mb": round(self.peak_tmp / _MB, 1),
+                "net_requests": self.net_requests,
+                "net_bytes": self.net_bytes,
+            }
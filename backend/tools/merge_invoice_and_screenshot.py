@@ -4,35 +4,203 @@ merge_invoice_and_screenshot.py
 核心逻辑保持不变，只在循环里加一个 progress_cb 回调，实时上报百分比。
 """
 
+import hashlib
+import io
+import json
+import os
+import tempfile
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
+from threading import Lock
 from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 from PIL import Image, ImageOps
 import fitz  # PyMuPDF
 
 PAGE_W, PAGE_H = landscape(A4)
 
-def render_first_page_to_png(pdf_path: Path, dpi=150):
-    doc = fitz.open(pdf_path)
-    page = doc.load_page(0)
-    pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72), alpha=False)
-    tmp_png = pdf_path.with_suffix(".tmp_invoice.png")
-    pix.save(tmp_png.as_posix())
-    w_pt, h_pt = page.rect.width, page.rect.height
-    doc.close()
-    return tmp_png, w_pt, h_pt
+# ------------------ 发票渲染缓存 ------------------ #
+# 同一张发票常出现在多个批次（草稿包 / 终稿包），按 (内容哈希, 页码, dpi) 缓存渲染结果。
+# 内存层：LRU，按字节数封顶；磁盘层（可选）：RENDER_CACHE_DIR 指定目录，增量记总大小，超限才扫目录按 mtime 淘汰。
+RENDER_CACHE_MEM_BYTES = int(os.environ.get("RENDER_CACHE_MEM_MB", 256)) * 1024 * 1024
+RENDER_CACHE_DISK_BYTES = int(os.environ.get("RENDER_CACHE_DISK_MB", 1024)) * 1024 * 1024
+RENDER_CACHE_DIR = os.environ.get("RENDER_CACHE_DIR", "")
+
+
+class RenderCache:
+    """(sha256, page, dpi) -> (png_bytes, w_pt, h_pt) 的 LRU 缓存，线程安全。"""
+
+    def __init__(self, max_bytes: int, disk_dir: str = "", disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._items: "OrderedDict[tuple, tuple[bytes, float, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self.hits = self.misses = 0
+        self._disk_lock = Lock()
+        self._disk_size = None  # 磁盘层总字节数，首次写入时扫一遍目录，之后增量维护
+
+    # ---- 内存层 ----
+    def get(self, key: tuple):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item
+        item = self._disk_get(key)
+        with self._lock:
+            if item is not None:
+                self.hits += 1
+                self._put_mem(key, item)
+            else:
+                self.misses += 1
+        return item
+
+    def put(self, key: tuple, item: tuple):
+        with self._lock:
+            self._put_mem(key, item)
+        self._disk_put(key, item)
+
+    def _put_mem(self, key: tuple, item: tuple):
+        if len(item[0]) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._size -= len(old[0])
+        self._items[key] = item
+        self._size += len(item[0])
+        while self._size > self.max_bytes:
+            _, (png, _, _) = self._items.popitem(last=False)
+            self._size -= len(png)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._items), "bytes": self._size,
+                    "hits": self.hits, "misses": self.misses}
+
+    # ---- 磁盘层 ----
+    def _disk_path(self, key: tuple) -> Path:
+        digest, page, dpi = key
+        return self.disk_dir / f"{digest}_p{page}_{dpi}.png"
+
+    def _disk_get(self, key: tuple):
+        if not self.disk_dir:
+            return None
+        png_f = self._disk_path(key)
+        meta_f = png_f.with_suffix(".json")
+        try:
+            meta = json.loads(meta_f.read_text(encoding="utf-8"))
+            png = png_f.read_bytes()
+            os.utime(png_f)  # 刷新 mtime，作为磁盘层的 LRU 依据
+        except (OSError, ValueError):
+            return None  # 含读完后被其他线程淘汰的情况
+        return png, meta["w"], meta["h"]
+
+    def _disk_put(self, key: tuple, item: tuple):
+        if not self.disk_dir:
+            return
+        png, w_pt, h_pt = item
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            png_f = self._disk_path(key)
+            try:
+                old = png_f.stat().st_size
+            except OSError:
+                old = 0
+            # 先写临时文件再 os.replace，并发的 _disk_get 不会读到写了一半的 PNG
+            self._atomic_write(png_f, png)
+            self._atomic_write(png_f.with_suffix(".json"),
+                               json.dumps({"w": w_pt, "h": h_pt}).encode("utf-8"))
+            with self._disk_lock:
+                if self._disk_size is None:
+                    self._disk_size = self._disk_scan_size()
+                else:
+                    self._disk_size += len(png) - old
+                if self._disk_size > self.disk_max_bytes:
+                    self._disk_evict()
+        except OSError:
+            pass  # 磁盘缓存只是加速手段，写失败不影响合并
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _disk_scan_size(self) -> int:
+        total = 0
+        for f in self.disk_dir.glob("*.png"):
+            try:
+                total += f.stat().st_size
+            except OSError:
+                pass  # 扫描途中被淘汰
+        return total
+
+    def _disk_evict(self):
+        # 只在超限时才走到这里：按 mtime 从旧到新删，同时重新校准总字节数
+        files = []
+        for f in self.disk_dir.glob("*.png"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        files.sort(key=lambda t: t[0])
+        total = sum(size for _, size, _ in files)
+        for _, size, f in files:
+            if total <= self.disk_max_bytes:
+                break
+            f.unlink(missing_ok=True)
+            f.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
+        self._disk_size = total
+
+
+render_cache = RenderCache(RENDER_CACHE_MEM_BYTES, RENDER_CACHE_DIR, RENDER_CACHE_DISK_BYTES)
+
+
+def render_page_png(pdf_path: Path, page_no: int = 0, dpi: int = 150):
+    """渲染 PDF 指定页为 PNG 字节，返回 (png_bytes, w_pt, h_pt)；命中缓存则不再渲染。"""
+    data = Path(pdf_path).read_bytes()
+    key = (hashlib.sha256(data).hexdigest(), page_no, dpi)
+    item = render_cache.get(key)
+    if item is not None:
+        return item
+
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        page = doc.load_page(page_no)
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72), alpha=False)
+        item = (pix.tobytes("png"), page.rect.width, page.rect.height)
+    finally:
+        doc.close()
+    render_cache.put(key, item)
+    return item
 
 def draw_pair(c: canvas.Canvas, pdf_path: Path, img_path: Path, inv_ratio: float):
     margin = gap = 20
-    inv_png, pdf_w, pdf_h = render_first_page_to_png(pdf_path)
+    inv_png, pdf_w, pdf_h = render_page_png(pdf_path)
     max_inv_w = (PAGE_W - 2*margin - gap) * inv_ratio
     scale = min(max_inv_w / pdf_w, (PAGE_H - 2*margin) / pdf_h)
     inv_w, inv_h = pdf_w * scale, pdf_h * scale
     inv_x = margin
     inv_y = margin + (PAGE_H - 2*margin - inv_h)/2
-    c.drawImage(inv_png.as_posix(), inv_x, inv_y, inv_w, inv_h)
-    Path(inv_png).unlink(missing_ok=True)
+    c.drawImage(ImageReader(io.BytesIO(inv_png)), inv_x, inv_y, inv_w, inv_h)
 
     img = Image.open(img_path)
     img = ImageOps.exif_transpose(img)
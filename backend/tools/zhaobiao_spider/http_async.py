@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""asyncio 版 HTTP 客户端（httpx），重试/退避语义与 http_client.create_session 一致。
+
+单进程内可同时挂起上百个请求；连接数由 max_connections 限定，空闲连接 keep-alive 复用。
+"""
+
+import asyncio
+import time
+
+import charset_normalizer
+import httpx
+
+from .http_client import _guarded
+
+# 与 http_client 中 urllib3 Retry 保持一致
+RETRY_TOTAL = 3
+BACKOFF_FACTOR = 0.8
+STATUS_FORCELIST = (429, 500, 502, 503, 504)
+TIMEOUT = 20
+
+
+class AsyncRateLimiter:
+    """协程间共享的最小请求间隔（rate 次/秒），与 http_client.RateLimiter 同义。"""
+
+    def __init__(self, rate: float | None):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def create_async_client(max_connections: int = 100, max_keepalive: int = 20,
+                        keepalive_expiry: float = 30.0, http2: bool = False,
+                        rate: float | None = None, net_cb=None) -> httpx.AsyncClient:
+    """
+    max_connections: 同时打开的连接上限（超出的请求排队等连接）；
+    max_keepalive / keepalive_expiry: 保留的空闲连接数及其存活秒数；
+    http2: 需要安装 h2（pip install "httpx[http2]"）；
+    rate: 全局每秒请求上限，挂在 client.limiter 上，None 表示不节流；
+    net_cb(nbytes:int) -> None: 每收到一个响应调用一次，用于任务资源记账；
+    它抛出的异常会包成 http_client.CrawlAborted，中止整个任务。
+    """
+    hooks = {}
+    if net_cb:
+        cb = _guarded(net_cb)
+
+        async def _on_response(resp: httpx.Response):
+            await resp.aread()
+            cb(len(resp.content))
+        hooks["response"] = [_on_response]
+
+    client = httpx.AsyncClient(
+        event_hooks=hooks,
+        limits=httpx.Limits(max_connections=max_connections,
+                            max_keepalive_connections=max_keepalive,
+                            keepalive_expiry=keepalive_expiry),
+        timeout=TIMEOUT,
+        http2=http2,
+        follow_redirects=True,
+    )
+    client.limiter = AsyncRateLimiter(rate)
+    return client
+
+
+def _backoff(attempt: int, resp: httpx.Response | None) -> float:
+    # 429/503 带 Retry-After 时优先听服务器的
+    if resp is not None and resp.status_code in (429, 503):
+        ra = resp.headers.get("Retry-After", "")
+        if ra.isdigit():
+            return float(ra)
+    return BACKOFF_FACTOR * (2 ** (attempt - 1))
+
+
+async def request(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+    """带重试的请求：连接/超时错误及 STATUS_FORCELIST 状态码最多重试 RETRY_TOTAL 次。"""
+    limiter = getattr(client, "limiter", None)
+    for attempt in range(1, RETRY_TOTAL + 2):
+        if limiter:
+            await limiter.wait()
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if attempt > RETRY_TOTAL:
+                raise
+            await asyncio.sleep(_backoff(attempt, None))
+            continue
+        if resp.status_code in STATUS_FORCELIST and attempt <= RETRY_TOTAL:
+            await asyncio.sleep(_backoff(attempt, resp))
+            continue
+        resp.raise_for_status()
+        return resp
+
+
+async def post_json(client: httpx.AsyncClient, url: str, headers: dict, body: dict) -> dict:
+    r = await request(client, "POST", url, headers=headers, json=body)
+    return r.json()
+
+
+async def get_text(client: httpx.AsyncClient, url: str) -> str:
+    """GET 并按内容探测编码解码（对应 requests 的 resp.apparent_encoding）。"""
+    r = await request(client, "GET", url)
+    best = charset_normalizer.from_bytes(r.content).best()
+    return str(best) if best is not None else r.text
@@ -1,16 +1,111 @@
 # -*- coding: utf-8 -*-
+import time
+from threading import Lock
+
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
-def create_session() -> requests.Session:
-    s = requests.Session()
-    retry = Retry(
-        total=3, backoff_factor=0.8,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "POST"]
-    )
-    adapter = HTTPAdapter(max_retries=retry)
+
+class CrawlAborted(RuntimeError):
+    """net_cb 抛出的异常（如任务超出资源限额）：中止整个抓取任务，不当作单个分类/请求的失败。"""
+
+
+def _guarded(net_cb):
+    def _cb(nbytes: int):
+        try:
+            net_cb(nbytes)
+        except Exception as e:
+            raise CrawlAborted(str(e)) from e
+    return _cb
+
+
+class RateLimiter:
+    """全局请求节流：所有线程共享一个最小请求间隔（rate 次/秒）。"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+RETRY_TOTAL = 3
+BACKOFF_FACTOR = 0.8
+STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+
+def _backoff(attempt: int, resp: requests.Response | None) -> float:
+    # 与 urllib3 Retry 一致：429/503 带 Retry-After 时优先听服务器的
+    if resp is not None and resp.status_code in (429, 503):
+        ra = resp.headers.get("Retry-After", "")
+        if ra.isdigit():
+            return float(ra)
+    return BACKOFF_FACTOR * (2 ** (attempt - 1))
+
+
+class RateLimitedSession(requests.Session):
+    """
+    每次请求（含处理器里的详情页 GET）前先向 RateLimiter 申请额度。
+    重试也在这里做而不是交给 adapter 里的 urllib3 Retry，
+    否则服务器返回 429/5xx 时的重试会绕过全局额度。
+    """
+
+    def __init__(self, limiter: RateLimiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def request(self, *args, **kwargs):
+        for attempt in range(1, RETRY_TOTAL + 2):
+            self.limiter.wait()
+            try:
+                resp = super().request(*args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt > RETRY_TOTAL:
+                    raise
+                time.sleep(_backoff(attempt, None))
+                continue
+            if resp.status_code in STATUS_FORCELIST and attempt <= RETRY_TOTAL:
+                resp.close()
+                time.sleep(_backoff(attempt, resp))
+                continue
+            return resp
+
+
+def create_session(pool_connections: int = 10, pool_maxsize: int = 10,
+                   rate: float | None = None, net_cb=None) -> requests.Session:
+    """
+    pool_connections: 缓存的主机连接池个数；pool_maxsize: 每个主机池的最大连接数，
+    多线程共享同一 session 时应不小于并发线程数，否则多出的连接用完即弃。
+    rate: 每秒最多请求数（全局），None 表示不节流。
+    net_cb(nbytes:int) -> None  # 每收到一个响应调用一次，用于任务资源记账；
+                                # 它抛出的异常会包成 CrawlAborted，中止整个任务
+    """
+    if rate:
+        s = RateLimitedSession(RateLimiter(rate))
+        retry = Retry(total=0, raise_on_status=False)  # 重试由 RateLimitedSession 负责
+    else:
+        s = requests.Session()
+        retry = Retry(
+            total=RETRY_TOTAL, backoff_factor=BACKOFF_FACTOR,
+            status_forcelist=list(STATUS_FORCELIST),
+            allowed_methods=["GET", "POST"]
+        )
+    if net_cb:
+        cb = _guarded(net_cb)
+        s.hooks["response"].append(lambda r, *args, **kwargs: cb(len(r.content)))
+    adapter = HTTPAdapter(max_retries=retry,
+                          pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize)
     s.mount("http://", adapter)
     s.mount("https://", adapter)
     return s
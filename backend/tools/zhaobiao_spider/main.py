@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
-import os, csv, json, math, time, argparse
+import os, csv, json, math, time, argparse, asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from .post_data import url, headers, build, with_pagination
-from .http_client import create_session, post_json
+from .post_data import url, headers, build, with_pagination, choose_date_range_dialog
+from .http_client import create_session, post_json, CrawlAborted
 from .processors import get_processor
+from . import store
 
 def ensure_dir(path: str):
     os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -22,22 +24,24 @@ def save_json(path: str, rows: list[dict]):
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(rows, f, ensure_ascii=False, indent=2)
 
-def run(equal: str, rn: int, outfmt: str, start: str | None, end: str | None, no_dialog: bool):
-    session = create_session()
-
+def crawl(session, equal: str, rn: int, start: str | None, end: str | None,
+          interactive: bool = False, page_delay: float = 0.4):
+    """
+    抓取单个 equal 分类的全部分页。
+    返回 (rows, raw_pages)；总数为 0 时 rows 为空列表。
+    """
     # 构造带日期的探测请求
-    probe = build(equal, start, end, interactive=not no_dialog)
+    probe = build(equal, start, end, interactive=interactive)
     probe['rn'] = 1
     probe['pn'] = 0
     data0 = post_json(session, url, headers, probe)
     total = (data0.get('result') or {}).get('totalcount', 0)
-    print(f"总记录数: {total}")
+    print(f"[{equal}] 总记录数: {total}")
     if total <= 0:
-        return None
+        return [], []
 
     pages = math.ceil(total / rn)
     proc = get_processor(equal)
-    fields = getattr(proc, 'CSV_FIELDS', [])
     rows, raw_pages = [], []
 
     for p in range(pages):
@@ -49,10 +53,79 @@ def run(equal: str, rn: int, outfmt: str, start: str | None, end: str | None, no
         for rec in recs:
             # 处理每条记录，部分字段需要进入详情页解析
             rows.append(proc.extract_from_list(rec, session))
-        print(f"第 {p+1}/{pages} 页，拉取 {len(recs)} 条")
-        time.sleep(0.4)
+        print(f"[{equal}] 第 {p+1}/{pages} 页，拉取 {len(recs)} 条")
+        if page_delay:
+            time.sleep(page_delay)
+    return rows, raw_pages
 
-    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+async def _gather_or_cancel(*coros):
+    """同 asyncio.gather，但任一协程失败时取消其余仍在途的请求再抛出。"""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def crawl_async(client, equal: str, rn: int, start: str | None, end: str | None):
+    """crawl() 的异步版本：所有分页及详情页并发发出，在途数量由 client 的连接池上限约束。"""
+    from . import http_async
+
+    probe = build(equal, start, end, interactive=False)
+    probe['rn'] = 1
+    probe['pn'] = 0
+    data0 = await http_async.post_json(client, url, headers, probe)
+    total = (data0.get('result') or {}).get('totalcount', 0)
+    print(f"[{equal}] 总记录数: {total}")
+    if total <= 0:
+        return [], []
+
+    pages = math.ceil(total / rn)
+    proc = get_processor(equal)
+    raw_pages = await _gather_or_cancel(*(
+        http_async.post_json(client, url, headers,
+                             with_pagination(build(equal, start, end, interactive=False), p * rn, rn))
+        for p in range(pages)))
+    recs = [rec for data in raw_pages for rec in ((data.get('result') or {}).get('records', []) or [])]
+    print(f"[{equal}] {pages} 页共 {len(recs)} 条，抓取详情…")
+    rows = await _gather_or_cancel(*(proc.extract_from_list_async(rec, client) for rec in recs))
+    return list(rows), list(raw_pages)
+
+def _check_async(equals: list[str]):
+    """异步引擎开跑前检查处理器，不支持的分类在发任何请求前就报错。"""
+    bad = [e for e in equals if not get_processor(e).supports_async()]
+    if bad:
+        raise NotImplementedError(f"以下分类的处理器不支持异步引擎: {bad}，请改用 engine=sync")
+
+async def _crawl_many_async(equals: list[str], rn: int, start: str | None, end: str | None,
+                            max_connections: int, http2: bool, rate: float | None,
+                            net_cb=None) -> dict:
+    """
+    一个事件循环、一个 AsyncClient 跑完所有分类；返回 {equal: (rows, raw_pages) | Exception}。
+    单个分类失败只记在结果里；CrawlAborted 则取消所有分类并直接抛出。
+    """
+    from . import http_async
+
+    _check_async(equals)
+
+    async with http_async.create_async_client(max_connections=max_connections, http2=http2,
+                                              rate=rate, net_cb=net_cb) as client:
+        async def _one(equal: str):
+            try:
+                return await crawl_async(client, equal, rn, start, end)
+            except CrawlAborted:
+                raise
+            except Exception as e:
+                return e
+
+        results = await _gather_or_cancel(*(_one(e) for e in equals))
+    return dict(zip(equals, results))
+
+def write_outputs(equal: str, rows: list[dict], raw_pages: list, outfmt: str, ts: str) -> str:
+    """写出 output/{equal}_{ts}.csv|json 及 _raw.json，返回主文件路径。"""
+    fields = getattr(get_processor(equal), 'CSV_FIELDS', [])
     outbase = os.path.abspath(f'./output/{equal}_{ts}')
     if outfmt == 'csv':
         save_csv(f'{outbase}.csv', rows, fields)
@@ -68,13 +141,129 @@ def run(equal: str, rn: int, outfmt: str, start: str | None, end: str | None, no
     print(f'原始JSON: {outbase}_raw.json')
     return main_file
 
+def run(equal: str, rn: int, outfmt: str, start: str | None, end: str | None, no_dialog: bool,
+        engine: str = "sync", max_connections: int = 100, http2: bool = False, net_cb=None,
+        rate: float | None = 5.0):
+    """
+    engine="async" 时用 httpx 异步客户端并发抓取分页与详情页（需安装 httpx）。
+    rate: 全局每秒请求上限（列表页、详情页、重试都计入），两种引擎都生效；
+          None 表示不节流，此时同步引擎退回每页间隔 0.4 秒。
+    net_cb(nbytes:int) -> None  # 每个网络响应回调一次
+    """
+    if engine == "async":
+        _check_async([equal])
+        if not (start and end) and not no_dialog:
+            start, end = choose_date_range_dialog(start, end)
+        res = asyncio.run(_crawl_many_async([equal], rn, start, end, max_connections, http2,
+                                            rate, net_cb))[equal]
+        if isinstance(res, Exception):
+            raise res
+        rows, raw_pages = res
+    else:
+        session = create_session(rate=rate, net_cb=net_cb)
+        rows, raw_pages = crawl(session, equal, rn, start, end, interactive=not no_dialog,
+                                page_delay=0 if rate else 0.4)
+    if not rows and not raw_pages:
+        return None
+
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    main_file = write_outputs(equal, rows, raw_pages, outfmt, ts)
+    print(f'本地库写入 {store.upsert_rows(equal, rows)} 条')
+    return main_file
+
+def run_many(equals: list[str], rn: int, outfmt: str, start: str | None, end: str | None,
+             no_dialog: bool, workers: int = 4, rate: float = 5.0,
+             engine: str = "sync", max_connections: int = 100, http2: bool = False,
+             net_cb=None, cpu_cb=None):
+    """
+    多个 equal 分类并发抓取：共用一个连接池 session，所有分类共享 rate 次/秒的全局请求额度。
+    engine="async" 时改为单个事件循环 + httpx.AsyncClient，workers 不再起作用，
+    并发由 max_connections 约束。
+    每个分类单独写出结果文件并写入本地库，另写 output/summary_{ts}.json 汇总。
+    返回 (summary_path, results)，results 为 {equal: {count, file, error}}。
+    net_cb 抛出异常（如超出资源限额）时以 CrawlAborted 中止整个任务，不写部分结果。
+    cpu_cb(seconds:float) -> None  # sync 引擎下每个分类结束时报告所在工作线程的 CPU 时间
+    """
+    equals = list(dict.fromkeys(equals))  # 去重并保持顺序
+    for equal in equals:
+        get_processor(equal)  # 未注册的分类提前报错，不必等线程里失败
+    if engine == "async":
+        _check_async(equals)
+
+    # 日期只问一次，避免每个线程各自弹窗
+    if not (start and end) and not no_dialog:
+        start, end = choose_date_range_dialog(start, end)
+
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if engine == "async":
+        crawled = asyncio.run(_crawl_many_async(equals, rn, start, end, max_connections, http2,
+                                                rate, net_cb))
+    else:
+        workers = max(1, min(workers, len(equals)))
+        session = create_session(pool_maxsize=workers * 2, rate=rate, net_cb=net_cb)
+
+        def _one(equal: str):
+            cpu0 = time.thread_time()  # 工作线程的 CPU 调用方的 thread_time 看不到，单独上报
+            try:
+                return crawl(session, equal, rn, start, end, page_delay=0)
+            except CrawlAborted:
+                raise  # 整个任务中止，不算单个分类失败
+            except Exception as e:
+                return e
+            finally:
+                if cpu_cb:
+                    cpu_cb(time.thread_time() - cpu0)
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            crawled = dict(zip(equals, pool.map(_one, equals)))
+        finally:
+            # 中止时不再启动排队中的分类；在跑的线程下一次响应回调就会同样中止
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    results = {}
+    for equal, res in crawled.items():
+        try:
+            if isinstance(res, Exception):
+                raise res
+            rows, raw_pages = res
+            file = write_outputs(equal, rows, raw_pages, outfmt, ts) if raw_pages else None
+            store.upsert_rows(equal, rows)
+            results[equal] = {"count": len(rows), "file": file, "error": None}
+        except Exception as e:
+            results[equal] = {"count": 0, "file": None, "error": str(e)}
+
+    summary = {
+        "start": start,
+        "end": end,
+        "total": sum(r["count"] for r in results.values()),
+        "categories": results,
+    }
+    summary_path = os.path.abspath(f'./output/summary_{ts}.json')
+    save_json(summary_path, summary)
+    print(f'汇总: {summary_path}')
+    return summary_path, results
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("--equal", required=True, help="例如 002001009")
+    ap.add_argument("--equal", required=True, help="例如 002001009；多个分类用逗号分隔")
     ap.add_argument("--rn", type=int, default=100)
     ap.add_argument("--out", choices=["csv","json"], default="csv")
     ap.add_argument("--start", help="开始日期 YYYY-MM-DD（可选）")
     ap.add_argument("--end", help="结束日期 YYYY-MM-DD（可选）")
     ap.add_argument("--no-dialog", action="store_true", help="禁用交互对话框")
+    ap.add_argument("--workers", type=int, default=4, help="多分类并发数")
+    ap.add_argument("--rate", type=float, default=5.0, help="全局每秒请求上限（0 表示不节流）")
+    ap.add_argument("--engine", choices=["sync", "async"], default="sync",
+                    help="async: httpx 异步并发抓取（需安装 httpx）")
+    ap.add_argument("--max-connections", type=int, default=100, help="async 引擎的连接池上限")
+    ap.add_argument("--http2", action="store_true", help="async 引擎启用 HTTP/2（需安装 h2）")
     args = ap.parse_args()
-    run(args.equal, args.rn, args.out, args.start, args.end, args.no_dialog)
+    equals = [e.strip() for e in args.equal.split(",") if e.strip()]
+    if len(equals) > 1:
+        run_many(equals, args.rn, args.out, args.start, args.end, args.no_dialog,
+                 args.workers, args.rate, args.engine, args.max_connections, args.http2)
+    else:
+        run(equals[0], args.rn, args.out, args.start, args.end, args.no_dialog,
+            args.engine, args.max_connections, args.http2, rate=args.rate or None)
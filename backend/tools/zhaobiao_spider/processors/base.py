@@ -10,3 +10,18 @@ class BaseProcessor(ABC):
     def extract_from_list(self, record: Dict[str, Any], session: requests.Session) -> Dict[str, Any]:
         """从列表记录抽取目标字段，必要时可使用 session 抓取详情页。"""
         ...
+
+    def supports_async(self) -> bool:
+        """needs_detail 的处理器须覆盖 extract_from_list_async 才能走异步引擎。"""
+        return (not self.needs_detail
+                or type(self).extract_from_list_async is not BaseProcessor.extract_from_list_async)
+
+    async def extract_from_list_async(self, record: Dict[str, Any], client) -> Dict[str, Any]:
+        """异步版本，client 为 http_async.create_async_client() 返回的 httpx.AsyncClient。
+
+        默认只适用于不抓详情页的处理器；needs_detail=True 的处理器须自行覆盖
+        （crawl_async 前会用 supports_async 检查，避免抓完列表页才失败）。
+        """
+        if self.needs_detail:
+            raise NotImplementedError(f"{type(self).__name__} 未实现异步详情抓取")
+        return self.extract_from_list(record, None)
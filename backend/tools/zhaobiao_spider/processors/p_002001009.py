@@ -63,6 +63,31 @@ class TenderPlanProcessor(BaseProcessor):
     def extract_from_list(self, record: Dict[str, Any], session: requests.Session) -> Dict[str, Any]:
         """从列表记录中抓取基础字段并解析详情页。"""
 
+        row = self._base_row(record)
+        link = row['网页链接']
+
+        html = ''
+        if link:
+            resp = session.get(link, timeout=20)
+            resp.raise_for_status()
+            resp.encoding = resp.apparent_encoding
+            html = resp.text
+
+        return self._finish_row(row, html)
+
+    async def extract_from_list_async(self, record: Dict[str, Any], client) -> Dict[str, Any]:
+        """异步版本：详情页经 http_async.get_text 抓取，解析逻辑与同步版一致。"""
+
+        from ..http_async import get_text
+
+        row = self._base_row(record)
+        link = row['网页链接']
+        html = await get_text(client, link) if link else ''
+        return self._finish_row(row, html)
+
+    def _base_row(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """列表记录中直接可得的字段。"""
+
         title = (record.get('titlenew') or '').strip()
         where = (record.get('zhuanzai') or '').strip()
         link = (record.get('linkurl') or '').strip()
@@ -75,7 +100,7 @@ class TenderPlanProcessor(BaseProcessor):
         design_cnt = content.count('设计')
         construction_cnt = content.count('施工')
 
-        row = {
+        return {
             '项目名称': title,
             '项目所在地': where,
             '网页链接': link,
@@ -85,16 +110,12 @@ class TenderPlanProcessor(BaseProcessor):
             '施工统计': construction_cnt,
         }
 
-        html = ''
-        if link:
-            resp = session.get(link, timeout=20)
-            resp.raise_for_status()
-            resp.encoding = resp.apparent_encoding
-            html = resp.text
+    def _finish_row(self, row: Dict[str, Any], html: str) -> Dict[str, Any]:
+        """合并详情页解析结果。"""
 
         detail = self._parse_detail(html)
         if not detail.get('拟招标项目名称'):
-            detail['拟招标项目名称'] = title
+            detail['拟招标项目名称'] = row['项目名称']
         row.update(detail)
         return row
 
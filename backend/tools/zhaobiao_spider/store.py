@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""本地招标库：爬取结果按 网页链接 去重写入 SQLite，供 /api/zhaobiao/search 离线查询。
+
+- tenders 表：常用过滤列（日期 / 所在地 / 投资额 / 分类）单独成列并建索引，整行原样存 JSON，
+  body 列存全文检索用的拼接文本；
+- tenders_fts：FTS5 trigram 全文索引（所在地 + body），rowid 与 tenders.rowid 一致，
+  SQLite 不支持时退回 LIKE（同样只查所在地 + body，两条路径结果一致）。
+"""
+
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+DB_PATH = os.environ.get("ZHAOBIAO_DB", os.path.abspath("./output/zhaobiao.db"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenders (
+    link       TEXT PRIMARY KEY,
+    equal      TEXT NOT NULL,
+    title      TEXT,
+    location   TEXT,
+    pubdate    TEXT,
+    investment REAL,
+    body       TEXT NOT NULL DEFAULT '',
+    data       TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tenders_pubdate ON tenders(pubdate);
+CREATE INDEX IF NOT EXISTS idx_tenders_equal_pubdate ON tenders(equal, pubdate);
+CREATE INDEX IF NOT EXISTS idx_tenders_location ON tenders(location);
+CREATE INDEX IF NOT EXISTS idx_tenders_investment ON tenders(investment);
+"""
+
+# trigram 分词对中文可做任意 ≥3 字的子串匹配
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tenders_fts
+USING fts5(body, tokenize='trigram');
+"""
+
+# PRAGMA user_version；1：FTS 改按 rowid 关联并收录所在地，投资额按新规则重算
+_SCHEMA_VERSION = 1
+
+_FTS_FIELDS = ('项目名称', '内容', '拟招标项目名称', '建设内容')
+
+
+def connect(db_path: str | None = None) -> sqlite3.Connection:
+    """打开（必要时建好）库；每个线程/请求各用各的连接。"""
+    path = db_path or DB_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    cols = {r["name"] for r in conn.execute("PRAGMA table_info(tenders)")}
+    if "body" not in cols:  # 早期建的库没有 body 列，补列并从 data 回填
+        with conn:
+            conn.execute("ALTER TABLE tenders ADD COLUMN body TEXT NOT NULL DEFAULT ''")
+            for r in conn.execute("SELECT link, data FROM tenders").fetchall():
+                conn.execute("UPDATE tenders SET body = ? WHERE link = ?",
+                             (_body(json.loads(r["data"])), r["link"]))
+    try:
+        conn.executescript(_FTS_SCHEMA)
+    except sqlite3.OperationalError:
+        pass  # 无 FTS5 / trigram，搜索时退回 LIKE
+    if conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+        _migrate(conn)
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection):
+    with conn:
+        for r in conn.execute("SELECT link, data FROM tenders").fetchall():
+            conn.execute("UPDATE tenders SET investment = ? WHERE link = ?",
+                         (parse_amount(json.loads(r["data"]).get('估算总投资（元）')), r["link"]))
+        if _has_fts(conn):  # 旧表按 link UNINDEXED 关联，删改要全表扫，直接重建
+            conn.execute("DROP TABLE tenders_fts")
+            conn.execute(_FTS_SCHEMA)
+            rebuild_fts(conn)
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+
+def rebuild_fts(conn: sqlite3.Connection):
+    """按 tenders 重建全文索引。tenders 没有 INTEGER PRIMARY KEY，VACUUM 可能重排 rowid，之后需调用一次。"""
+    conn.execute("DELETE FROM tenders_fts")
+    conn.execute("INSERT INTO tenders_fts (rowid, body) "
+                 "SELECT rowid, location || char(10) || body FROM tenders")
+
+
+def _body(row: dict) -> str:
+    return "\n".join(str(row.get(k) or '') for k in _FTS_FIELDS)
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name='tenders_fts'").fetchone() is not None
+
+
+def _like(s: str) -> str:
+    """转义 LIKE 通配符，配合 ESCAPE '\\' 使用"""
+    return "%" + s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def parse_amount(text) -> float | None:
+    """'1.2亿元' / '3500万元' / '12,000,000' -> 元；识别不了返回 None
+
+    文本里取第一个带 亿/万/元 单位的数；没有单位时只接受纯数字，
+    免得 '2023年投资…' 这类把年份当成金额。
+    """
+    if text is None or text == "":
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    s = str(text).replace(",", "").replace("，", "")
+    m = (re.search(r'(\d+(?:\.\d+)?)\s*(亿|万|元)', s)
+         or re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*()', s))
+    if not m:
+        return None
+    n = float(m.group(1))
+    unit = m.group(2)
+    if unit == "亿":
+        n *= 1e8
+    elif unit == "万":
+        n *= 1e4
+    return n
+
+
+def upsert_rows(equal: str, rows: list[dict], db_path: str | None = None) -> int:
+    """按 网页链接 去重写入（已有则覆盖），返回写入条数；无链接的行跳过。"""
+    now = datetime.now().isoformat(timespec="seconds")
+    conn = connect(db_path)
+    fts = _has_fts(conn)
+    n = 0
+    try:
+        with conn:
+            for row in rows:
+                link = (row.get('网页链接') or '').strip()
+                if not link:
+                    continue
+                body = _body(row)
+                location = row.get('项目所在地') or ''
+                conn.execute(
+                    "INSERT INTO tenders (link, equal, title, location, pubdate, investment, body, data, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(link) DO UPDATE SET equal=excluded.equal, title=excluded.title, "
+                    "location=excluded.location, pubdate=excluded.pubdate, investment=excluded.investment, "
+                    "body=excluded.body, data=excluded.data, updated_at=excluded.updated_at",
+                    (link, equal, row.get('项目名称') or '', location,
+                     str(row.get('公示时间') or '')[:10],
+                     parse_amount(row.get('估算总投资（元）')),
+                     body, json.dumps(row, ensure_ascii=False), now))
+                if fts:
+                    rowid = conn.execute("SELECT rowid FROM tenders WHERE link = ?",
+                                         (link,)).fetchone()[0]
+                    conn.execute("DELETE FROM tenders_fts WHERE rowid = ?", (rowid,))
+                    conn.execute("INSERT INTO tenders_fts (rowid, body) VALUES (?, ?)",
+                                 (rowid, f"{location}\n{body}"))
+                n += 1
+    finally:
+        conn.close()
+    return n
+
+
+def search(start: str | None = None, end: str | None = None, location: str | None = None,
+           min_amount: float | None = None, max_amount: float | None = None,
+           q: str | None = None, equal: str | None = None,
+           limit: int = 100, offset: int = 0, db_path: str | None = None) -> dict:
+    """
+    组合过滤查询，按公示时间倒序。
+    start/end: YYYY-MM-DD（含端点）；location: 所在地子串；q: 全文关键词（空格分隔，全部命中）。
+    返回 {"total": int, "rows": list[dict]}。
+    """
+    where, args = [], []
+    if start:
+        where.append("t.pubdate >= ?"); args.append(start)
+    if end:
+        where.append("t.pubdate <= ?"); args.append(end)
+    if equal:
+        where.append("t.equal = ?"); args.append(equal)
+    if location:
+        where.append("t.location LIKE ? ESCAPE '\\'"); args.append(_like(location))
+    if min_amount is not None:
+        where.append("t.investment >= ?"); args.append(min_amount)
+    if max_amount is not None:
+        where.append("t.investment <= ?"); args.append(max_amount)
+
+    conn = connect(db_path)
+    try:
+        fts = _has_fts(conn)
+        for kw in (q or "").split():
+            if fts and len(kw) >= 3:
+                where.append("t.rowid IN (SELECT rowid FROM tenders_fts WHERE tenders_fts MATCH ?)")
+                args.append('"' + kw.replace('"', '""') + '"')
+            else:
+                # trigram 至少 3 个字，短词只能扫表；与 FTS 查同样的列（标题已含在 body 里）
+                where.append("(t.location LIKE ? ESCAPE '\\' OR t.body LIKE ? ESCAPE '\\')")
+                args.extend([_like(kw)] * 2)
+
+        cond = f"WHERE {' AND '.join(where)}" if where else ""
+        total = conn.execute(f"SELECT COUNT(*) FROM tenders t {cond}", args).fetchone()[0]
+        cur = conn.execute(
+            f"SELECT t.equal, t.data FROM tenders t {cond} "
+            f"ORDER BY t.pubdate DESC, t.link LIMIT ? OFFSET ?",
+            [*args, limit, offset])
+        rows = [{"equal": r["equal"], **json.loads(r["data"])} for r in cur]
+    finally:
+        conn.close()
+    return {"total": total, "rows": rows}
@@ -87,6 +87,29 @@ function initExtract() {
   const bar     = document.getElementById("extract-bar");
   const spin    = document.getElementById("extract-spinner");
   const status  = document.getElementById("extract-status");
+  const xlsx    = document.getElementById("extract-xlsx");
+  const rowsBox = document.getElementById("extract-rows");
+
+  // 增量拉取已解析的行，返回新的游标
+  async function pullRows(task_id, since) {
+    const res = await fetch(`/api/extract/${task_id}/rows?since=${since}`);
+    if (!res.ok) return since;
+    const text = await res.text();
+    for (const line of text.split("\n").filter(Boolean)) {
+      const r = JSON.parse(line);
+      rowsBox.textContent += `${r["文件名"]}\t${r["发票号码"]}\t${r["开票日期"]}\n`;
+    }
+    rowsBox.scrollTop = rowsBox.scrollHeight;
+    return Number(res.headers.get("X-Next-Since") || since);
+  }
+
+  function download(url) {
+    const a = document.createElement("a");
+    a.href = url;
+    document.body.appendChild(a);
+    a.click();
+    a.remove();
+  }
 
   btn.addEventListener("click", () => {
     if (!input.files.length) {
@@ -96,12 +119,15 @@ function initExtract() {
 
     // reset UI
     status.textContent = "";
+    rowsBox.textContent = "";
+    rowsBox.classList.add("hidden");
     bar.style.width = "0%";
     barWrap.classList.remove("hidden");
     spin.classList.add("hidden");
 
     const fd = new FormData();
     for (const f of input.files) fd.append("files", f, f.webkitRelativePath);
+    fd.append("xlsx", xlsx.checked ? "1" : "0");
 
     const xhr = new XMLHttpRequest();
     xhr.open("POST", "/api/extract");
@@ -121,26 +147,32 @@ function initExtract() {
       const { task_id } = xhr.response;
       bar.style.width = "0%";
       spin.classList.remove("hidden");
+      rowsBox.classList.remove("hidden");
+      let since = 0;
 
-      const timer = setInterval(async () => {
+      // 用 setTimeout 串行轮询：上一轮（含拉取逐条结果）结束后才排下一轮，
+      // 服务器慢时不会两轮拿同一个 since 重复追加
+      const poll = async () => {
         const res = await fetch(`/api/progress/${task_id}`);
-        if (!res.ok) { clearInterval(timer); return; }
+        if (!res.ok) return;
         const info = await res.json();
+        if ((info.rows_done || 0) > since) since = await pullRows(task_id, since);
 
-        if (info.status === "processing") {
-          bar.style.width = info.pct + "%";
-        } else if (info.status === "done") {
-          clearInterval(timer);
+        if (info.status === "done") {
           bar.style.width = "100%";
           spin.classList.add("hidden");
           status.textContent = "提取完成，正在下载…";
-          window.location.href = `/api/download/${task_id}`;
+          download(`/api/download/${task_id}?kind=txt`);
+          if (info.xlsx) download(`/api/download/${task_id}?kind=xlsx`);
         } else if (info.status === "error") {
-          clearInterval(timer);
           spin.classList.add("hidden");
           status.textContent = "提取失败：" + info.error;
+        } else {
+          if (info.status === "processing") bar.style.width = info.pct + "%";
+          setTimeout(poll, 1000);
         }
-      }, 1000);
+      };
+      setTimeout(poll, 1000);
     };
 
     xhr.onerror = () => {
@@ -166,8 +198,10 @@ function initSpider() {
     status.textContent = "";
     spin.classList.remove("hidden");
 
+    // 多个分类用逗号分隔，后端共用一个连接池并发抓取
+    const codes = equal.value.split(/[,，\s]+/).filter(Boolean);
     const payload = {
-      equal: equal.value.trim(),
+      equal: codes.length > 1 ? codes : (codes[0] || ""),
       start: start.value || null,
       end: end.value || null,
       out: format.value
@@ -189,10 +223,12 @@ function initSpider() {
         const r = await fetch(`/api/progress/${task_id}`);
         if (!r.ok) { clearInterval(timer); spin.classList.add("hidden"); return; }
         const info = await r.json();
-        if (info.status === "done") {
+        if (info.status === "done" || info.status === "partial") {
           clearInterval(timer);
           spin.classList.add("hidden");
-          status.textContent = "爬取完成，正在下载…";
+          status.textContent = info.status === "partial"
+            ? "部分分类爬取失败，正在下载已完成的结果…"
+            : "爬取完成，正在下载…";
           window.location.href = `/api/download/${task_id}`;
         } else if (info.status === "error") {
           clearInterval(timer);